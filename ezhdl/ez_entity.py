@@ -29,16 +29,30 @@ from   ezhdl.ez_signal import *
 
 def procedure(func):
 	def wrapper(self):
-		if not hasattr(self, "_procedure"):
-			self._procedure = func(self)
+		proc = getattr(self, "_procedure", None)
+		if proc is None:
+			proc = self._procedure = func(self)
 		try:
-			next(self._procedure)
+			next(proc)
 		except:
 			pass
 	return wrapper
 
 class Entity(SignalContainer):
 
+	# the hierarchy does not change once elaborated, so sub-entities are only
+	# looked up the first time they are needed. The same goes for the flat
+	# lists of _run/_reset methods of the whole sub-hierarchy
+	_entities   = None
+	_flat_run   = None
+	_flat_reset = None
+
+	# optional sensitivity list (signals or names of signal attributes), like
+	# the one of a VHDL process: after its first run the entity is only run
+	# again in the delta cycles following a change of one of those signals.
+	# Entities without a sensitivity list run on every delta cycle
+	_sensitivity = None
+
 	def _run(self):
 		pass
 
@@ -46,16 +60,44 @@ class Entity(SignalContainer):
 		pass
 
 	def find_entities(self):
-		return [value for _, value in vars(self).items() if isinstance(value, Entity)]
+		if self._entities is None:
+			self._entities = [value for value in vars(self).values() if isinstance(value, Entity)]
+		return self._entities
+
+	def _flatten(self, method):
+		# bound methods of the whole sub-hierarchy, children before parents
+		ret = []
+		for e in self.find_entities():
+			ret += e._flatten(method)
+		fn = getattr(self, method)
+		if method == "_run" and self._sensitivity is not None:
+			fn = self._sensitive(fn)
+		ret.append(fn)
+		return ret
+
+	def _sensitive(self, fn):
+		signals = [getattr(self, s) if isinstance(s, str) else s for s in self._sensitivity]
+		started = False
+		def run():
+			nonlocal started
+			if started:
+				for s in signals:
+					if s.changed():
+						break
+				else:
+					return
+			started = True
+			fn()
+		return run
 
 	def run(self):
-		entities = self.find_entities()
-		for e in entities:
-			e.run()
-		self._run()
+		if self._flat_run is None:
+			self._flat_run = self._flatten("_run")
+		for fn in self._flat_run:
+			fn()
 
 	def reset(self):
-		entities = self.find_entities()
-		for e in entities:
-			e.reset()
-		self._reset()
+		if self._flat_reset is None:
+			self._flat_reset = self._flatten("_reset")
+		for fn in self._flat_reset:
+			fn()
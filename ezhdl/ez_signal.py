@@ -24,12 +24,13 @@
 # ---------------------------------------------------------------------------- #
 
 from   __future__ import annotations
-from   typing import List
+from   typing import Dict, Deque
 from   copy import deepcopy
+from   collections import deque
 
+import sys
 import math
 import weakref
-import inspect
 
 try:
 	from ezhdl.ez_types  import *
@@ -44,128 +45,230 @@ class SignalContent(object):
 	'''
 	SignalContent holds the actual objects, as well as their "next" counterpart
 	'''
+	__slots__ = ('_obj', '_next', '_assign_fn')
+
 	def __init__(self, obj):
 		if isinstance(obj, SignalContent):
-			self._obj = deepcopy(obj._obj)
+			self._obj = obj._obj._clone()
 		elif isinstance(obj, HwType):
-			self._obj = deepcopy(obj)
+			self._obj = obj._clone()
 		else:
 			raise Exception("Only HwTypes are allowed for signals")
 
-		self._next           = deepcopy(self._obj)
-		self._pend           = False
+		self._next      = self._obj._clone()
+
+		# resolving the assignment method once, update() runs on every delta
+		# cycle and should not look it up every time
+		self._assign_fn = self._obj._assign
 
 ################################################################################
 #                                    SIGNAL                                    #
 ################################################################################
 
+# edge flags are packed in a single integer, above them sits the epoch of the
+# update that produced them
+_CHANGED   = 1
+_POSEDGE   = 2
+_NEGEDGE   = 4
+_EDGE_BITS = 3
+
 class Signal(object):
 	'''
 	Signal Holds an array of SignalContent, and implements the "next" and "now"
 	methods to access the underlying objects
 	'''
-	instances : List["Signal"] = []
+	__slots__ = ('content', '_driver', '_drives', '_edges', '_transition_epoch',
+		'_net_cache', '_owner', '_creator', 'path', 'name', 'vcd', '__weakref__')
+
+	# registry of all live signals keyed by id(), entries are dropped
+	# automatically as soon as the signal is garbage collected
+	_instances : Dict[int, "Signal"] = weakref.WeakValueDictionary()
+
+	# contents whose "nxt" has been accessed since the last update, keyed by
+	# id() of the content so that connected signals (which share the content)
+	# only appear once. Only these need to be looked at by update()
+	_pending : Dict[int, "Signal"] = {}
+
+	# signals whose transition flag has been set since the last
+	# clear_changes(), keyed by id(). Dumpers only need to look at these
+	_dirty : Dict[int, "Signal"] = {}
+
+	# edge flags are only valid while their epoch matches the global one, this
+	# way expiring the flags of all signals is a single increment
+	_epoch       = 0
+	_clear_epoch = 0
+
+	# only ports check who is connecting them (see _owned_by_caller), so
+	# only they need to remember who created them
+	_track_creator = False
 
 	def __init__(self, obj:Signal|any, ppl:int=None):
 		if isinstance(obj, Signal):
 			if ppl is None:
 				ppl = len(obj.content)
-			self.content : List["SignalContent"] = []
+			self.content : Deque["SignalContent"] = deque()
 			for _ in range(ppl):
 				self.content.append(SignalContent(obj.content[0]))
 		else:
 			if ppl is None:
 				ppl = 0
-			self.content = []
+			self.content = deque()
 			for _ in range(ppl+1):
 				self.content.append(SignalContent(obj))
 
 		self._driver = None
-		self._drives : List["Signal"] = []
+		# signals disable __eq__, so the driven signals are keyed by id()
+		self._drives : Dict[int, "Signal"] = {}
+		self._net_cache = None
+
+		self._edges            = 0
+		self._transition_epoch = -1
 
-		self._changed    = False
-		self._posedge    = False
-		self._negedge    = False
-		self._transition = False
+		# container (entity or bundle) holding the signal, set once known. For
+		# ports, the object whose method is creating them is the most likely
+		# owner, it is only kept until the owner is first looked for
+		self._owner   = None
+		self._creator = sys._getframe(1).f_locals.get("self") if self._track_creator else None
 
 		self.path = ''
 		self.name = ''
 		self.vcd  = None
 
-		Signal.instances.append(weakref.ref(self))
+		Signal._instances[id(self)] = self
 
 
 	@property
 	def now(self):
 		return self.content[-1]._obj
 
+	def __getattr__(self, name):
+		# only called when the attribute is not found on the signal itself, in
+		# which case public attributes are looked up on the current object
+		if name.startswith('_') or name in Signal.__slots__:
+			raise AttributeError(name)
+		return getattr(self.content[-1]._obj, name)
+
 	@property
 	def tip(self):
 		return self.content[0]._obj
 
 	@property
 	def nxt(self):
-		# this is necessary because calling my_object.nxt[:] actually calls
-		# the getter and not the setter. So even just reading the _next might
-		# mean we are changing its value
-		self.content[0]._pend = True
 		return self.content[0]._next
 
 	@nxt.setter
 	def nxt(self, val):
-		pass
+		# "my_signal.nxt <<= x" reads the _next with the getter, assigns it in
+		# place and then stores it back through this setter, which is where
+		# the signal is marked as pending for update(). Re-assigning the
+		# current value (typical of combinational logic) is not worth an
+		# update() visit, except for pipelines which still have to shift
+		content = self.content
+		if len(content) == 1:
+			c = content[0]
+			if c._next == c._obj:
+				return
+		Signal._pending[id(content)] = self
+
+	@property
+	def nxt_rw(self):
+		# writing through a part of the _next (my_signal.nxt_rw[0] <<= x or
+		# my_signal.nxt_rw.field <<= x) never calls the setter, so the signal
+		# is marked as pending as soon as it is read this way
+		content = self.content
+		Signal._pending[id(content)] = self
+		return content[0]._next
 
 	@classmethod
 	def update(cls):
 		updated = 0
 
-		# it is important that FIRST we detect all changes to all signals before
-		# updating the contents seen that connected signals share contents
-		for i in Signal.instances:
-			s : Signal = i()
-			# evaluating edges for sensitivity lists
-			if s.content[0]._pend:
-				s._changed = s.changed_eval()
-				s._posedge = s.posedge_eval()
-				s._negedge = s.negedge_eval()
-				# the transition flag is sticky (used for logging and cleared by the simulator)
-				s._transition = s._changed
+		# the edges detected by the previous update expire here. This is the
+		# hottest loop of the simulator, so class attributes are read once
+		Signal._epoch += 1
+		epoch       = Signal._epoch
+		clear_epoch = Signal._clear_epoch
+		pending     = Signal._pending
+		dirty       = Signal._dirty
+		Signal._pending = {}
+
+		for content_id, s in pending.items():
+			content = s.content
+			# the signal has been connected after being written, its old
+			# content is not visible anymore
+			if id(content) != content_id:
+				continue
+
+			# it is important that FIRST we detect the edges before updating
+			# the content. Truth values give the same answer as comparing with
+			# zero but are much cheaper for ezhdl integers
+			tip     = content[0]
+			last    = content[-1]
+			old_set = bool(last._obj)
+			new_set = bool(tip._next if last is tip else content[-2]._obj)
+			posedge = new_set > old_set
+			negedge = old_set > new_set
+
+			if last is tip:
+				# the assignment itself reports whether the value changed
+				changed  = tip._assign_fn(tip._next)
+				updated += changed
 			else:
-				s._changed = False
-				s._posedge = False
-				s._negedge = False
-
-		# now we can do the actual content update
-		for i in Signal.instances:
-			s : Signal = i()
-			if s.content[0]._pend:
-				s.content[0]._pend = False
-
-				for i in range(1, len(s.content)):
-					s.content[i]._next._assign(s.content[i-1]._obj)
-
-				for c in s.content:
-					# update count needs to be done per content and not per signal
-					# due to pipelined signals which might be hiding changes within
-					# their pipeline
-					if c._obj != c._next:
+				# update count needs to be done per content and not per signal
+				# due to pipelined signals which might be hiding changes within
+				# their pipeline
+				changed = s.changed_eval()
+				prev = None
+				for c in content:
+					if c._obj != (tip._next if prev is None else prev._obj):
 						updated += 1
-
-					if hasattr(c._obj, "_assign"):
-						c._obj._assign(c._next)
-					else:
-						c._obj = deepcopy(c._next)
+					prev = c
+
+				# every pipeline stage takes the value of the previous one, so
+				# rather than copying the whole pipeline the oldest content is
+				# recycled as the new tip
+				last._assign_fn(tip._next)
+				content.rotate(1)
+				last._next, tip._next = tip._next, last._next
+
+			# edges are shared by all the signals of the net
+			net = s._net_cache
+			if net is None:
+				net = s._net()
+
+			edges = (epoch << _EDGE_BITS) | (changed * _CHANGED) | (posedge * _POSEDGE) | (negedge * _NEGEDGE)
+			for n in net:
+				n._edges = edges
+				# the transition flag is sticky (used for logging and cleared by the simulator)
+				if changed:
+					n._transition_epoch = clear_epoch
+					dirty[id(n)] = n
 		return updated
 
 
 	@classmethod
 	def clear_changes(cls):
-		for i in Signal.instances:
-			s : Signal = i()
-			s._changed = False
-			s._posedge = False
-			s._negedge = False
-			s._transition = False
+		Signal._epoch       += 1
+		Signal._clear_epoch += 1
+		Signal._dirty        = {}
+
+
+	def _net(self):
+		# all the signals sharing the same content: the root driver and
+		# everything it (directly or indirectly) drives. Connections do not
+		# change once the design is elaborated, so the result is cached on
+		# all the signals of the net until driver() connects it to another one
+		if self._net_cache is None:
+			root = self
+			while root._driver is not None:
+				root = root._driver
+			net = [root]
+			for s in net:
+				net.extend(s._drives.values())
+			net = tuple(net)
+			for s in net:
+				s._net_cache = net
+		return self._net_cache
 
 
 	def driver(self, b:Signal):
@@ -176,41 +279,91 @@ class Signal(object):
 			raise Exception("Only signals can be assigned to other signals")
 
 		# connecting signals means letting them "point" to the same underlying SignalContent
+		# this signal has no other driver, so it is the root of its own net and
+		# that net is exactly the set of signals sharing its content: they are
+		# all re-pointed in one pass instead of recursing through driver()
 		if self.now._check_type(b.now):
-			self.content = b.content
+			net     = self._net()
+			content = b.content
+			for s in net:
+				s.content = content
+			for s in net + (b._net_cache or ()):
+				s._net_cache = None
 			self._driver = b
-			present = False
-			for i in b._drives:
-				if i is self:
-					present = True
-			if not present:
-				b._drives.append(self)
-			for i in self._drives:
-				i.driver(self)
+			b._drives[id(self)] = self
 		else:
 			raise Exception(f"Source type ({type(b.content[0]._obj)}) not compatible with destination type ({type(self.content[0]._obj)})")
 
 
+	def _owned_by_caller(self):
+		# checks whether the signal is being connected by its owner. The frames
+		# are walked directly, inspect.stack() would also collect the source
+		# context of every frame which makes it very slow. Once the owner is
+		# known (or the creator of the signal turns out to hold it) frames are
+		# simply compared against it, otherwise each caller is searched for an
+		# attribute holding the signal (callers without a __dict__, e.g.
+		# signals themselves, cannot own a signal)
+		frame = sys._getframe(2)
+		owner = self._owner
+		if owner is None and self._creator is not None:
+			# the creator is only needed once, it is not kept alive any longer
+			creator = self._creator
+			self._creator = None
+			creator_vars = getattr(creator, "__dict__", None)
+			if creator_vars is not None:
+				for val in creator_vars.values():
+					if self is val:
+						owner = self._owner = creator
+						break
+		while frame is not None:
+			caller_self = frame.f_locals.get("self")
+			if owner is not None:
+				if caller_self is owner:
+					return True
+			else:
+				caller_vars = getattr(caller_self, "__dict__", None)
+				if caller_vars is not None:
+					for val in caller_vars.values():
+						if self is val:
+							self._owner = caller_self
+							return True
+			frame = frame.f_back
+		return False
+
+	def _incoming(self):
+		# the value "now" is going to take at the next update: the one written
+		# to "nxt" or, for pipelined signals, the one in the second-last stage
+		if len(self.content) > 1:
+			return self.content[-2]._obj
+		return self.content[-1]._next
+
 	def posedge_eval(self):
-		return (self.content[-1]._next != 0) and (self.content[-1]._obj == 0)
+		return (self._incoming() != 0) and (self.content[-1]._obj == 0)
 
 	def negedge_eval(self):
-		return (self.content[-1]._next == 0) and (self.content[-1]._obj != 0)
+		return (self._incoming() == 0) and (self.content[-1]._obj != 0)
 
 	def changed_eval(self):
-		return self.content[-1]._next != self.content[-1]._obj
+		return self._incoming() != self.content[-1]._obj
 
 	def posedge(self):
-		return self._posedge
+		edges = self._edges
+		return ((edges & _POSEDGE) != 0) and ((edges >> _EDGE_BITS) == Signal._epoch)
 
 	def negedge(self):
-		return self._negedge
+		edges = self._edges
+		return ((edges & _NEGEDGE) != 0) and ((edges >> _EDGE_BITS) == Signal._epoch)
 
 	def anyedge(self):
-		return self._posedge or self._negedge
+		edges = self._edges
+		return ((edges & (_POSEDGE | _NEGEDGE)) != 0) and ((edges >> _EDGE_BITS) == Signal._epoch)
 
 	def changed(self):
-		return self._changed
+		edges = self._edges
+		return ((edges & _CHANGED) != 0) and ((edges >> _EDGE_BITS) == Signal._epoch)
+
+	def transition(self):
+		return self._transition_epoch == Signal._clear_epoch
 
 	# BINDING ALL FUNCTIONS OF THE UNDERLYING OBJECT
 
@@ -219,11 +372,6 @@ class Signal(object):
 		self.driver(other)
 		return self
 
-	def __del__(self):
-		for i in range(len(Signal.instances)):
-			if Signal.instances[i]() is self:
-				Signal.instances.pop(i)
-
 	def __bool__(self):
 		raise Exception("Cannot use a signal as-is as boolean, use <signal>.now instead")
 
@@ -235,16 +383,12 @@ class Signal(object):
 ################################################################################
 
 class Input(Signal):
+	__slots__ = ()
+	_track_creator = True
 
 	def driver(self, b:Signal):
-		stack = inspect.stack()
-		for i in range(1, len(stack)):
-			caller_frame = stack[i]
-			caller_self = caller_frame.frame.f_locals.get("self")
-			if caller_self is not None:
-				for val in vars(caller_self).values():
-					if self is val:
-						raise Exception(f"Input Signal cannot have a _driver")
+		if self._owned_by_caller():
+			raise Exception(f"Input Signal cannot have a _driver")
 		super().driver(b)
 
 ################################################################################
@@ -252,18 +396,13 @@ class Input(Signal):
 ################################################################################
 
 class Output(Signal):
+	__slots__ = ()
+	_track_creator = True
 
 	def driver(self, b:Signal):
-		stack = inspect.stack()
-		for i in range(1, len(stack)):
-			caller_frame = stack[i]
-			caller_self = caller_frame.frame.f_locals.get("self")
-			if caller_self is not None:
-				for val in vars(caller_self).values():
-					if self is val:
-						super().driver(b)
-						return
-		raise Exception(f"Output Signal cannot have a _driver")
+		if not self._owned_by_caller():
+			raise Exception(f"Output Signal cannot have a _driver")
+		super().driver(b)
 
 
 ################################################################################
@@ -272,7 +411,9 @@ class Output(Signal):
 
 def local(obj):
 	if isinstance(obj, Signal):
-		return deepcopy(obj.now)
+		return obj.now._clone()
+	elif isinstance(obj, HwType):
+		return obj._clone()
 	else:
 		return deepcopy(obj)
 
@@ -290,8 +431,9 @@ class SignalContainer:
 			if isinstance(v, SignalContainer):
 				v.register_signals(('.'.join([parent_name, n])) if parent_name else n)
 			if isinstance(v, Signal):
-				v.path = parent_name
-				v.name = n
+				v.path   = parent_name
+				v.name   = n
+				v._owner = self
 
 # here we rename SignalContainer to Bundle for convenience
 class Bundle(SignalContainer):
@@ -300,6 +442,6 @@ class Bundle(SignalContainer):
 
 if __name__ == "__main__":
 	a = Signal(Array([Integer()]*4))
-	a.nxt[0] <<= 2
+	a.nxt_rw[0] <<= 2
 	Signal.update()
 	pass
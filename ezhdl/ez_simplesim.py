@@ -25,7 +25,9 @@
 
 from   __future__ import annotations
 from   typing   import List
-import keyboard as kb
+# underscored so that they are not exported along with the simulator
+import heapq  as _heapq
+import signal as _signal
 
 try:
 	from ezhdl.ez_types  import *
@@ -42,7 +44,8 @@ except:
 class SimpleSim:
 	stop_simulation = True
 	time_ps         = 0
-	event_times     = []
+	event_times     = [] # min-heap of pending event times
+	event_set       = set()
 	force_run       = False
 	force_dump      = False
 	cycle_limit     = 1000
@@ -51,11 +54,23 @@ class SimpleSim:
 	vcd_timescale   = "ps"
 	vcd_live        = False
 
+	# set asynchronously by the SIGINT (Ctrl+C) handler, the simulation loop
+	# only has to check it once per time step. A second Ctrl+C before the
+	# pause menu shows up (e.g. when stuck within a delta cycle) interrupts
+	# the simulation right away
+	pause_requested = False
+
 	@classmethod
 	def run(cls, dut:Entity):
-		print('Simulation Started, press "F10" to enter the Pause Menu')
+		print('Simulation Started, press "Ctrl+C" to enter the Pause Menu')
 		dut.reset()
 
+		try:
+			prev_handler = _signal.signal(_signal.SIGINT, cls._request_pause)
+		except ValueError:
+			# handlers can only be installed from the main thread
+			prev_handler = None
+
 		cls.stop_simulation = False
 		dut.register_signals()
 
@@ -65,56 +80,62 @@ class SimpleSim:
 
 		vcd.dump(int(cls.time_ps*vcd_time_mult), cls.force_dump)
 
-		# running simulation
-		while not cls.stop_simulation:
-			count = 0
-			while True:
-				dut.run()
-				updated = Signal.update()
-
-				if (updated == 0) and not cls.force_run:
+		try:
+			# running simulation
+			while not cls.stop_simulation:
+				count = 0
+				while True:
+					dut.run()
+					updated = Signal.update()
+
+					if (updated == 0) and not cls.force_run:
+						break
+					else:
+						if count >= cls.cycle_limit:
+							raise Exception("Potential cyclical assignment detected")
+						count += 1
+					cls.force_run = False
+
+				# dumping changes in VCD
+				vcd.dump(int(cls.time_ps*vcd_time_mult))
+				Signal.clear_changes()
+
+				if len(cls.event_times) == 0:
 					break
 				else:
-					if count >= cls.cycle_limit:
-						raise Exception("Potential cyclical assignment detected")
-					count += 1
-				cls.force_run = False
+					cls.time_ps = _heapq.heappop(cls.event_times)
+					cls.event_set.discard(cls.time_ps)
 
-			# dumping changes in VCD
-			vcd.dump(int(cls.time_ps*vcd_time_mult))
-			Signal.clear_changes()
-
-			if len(cls.event_times) == 0:
-				break
-			else:
-				cls.time_ps = cls.event_times[0]
-				cls.event_times.pop(0)
-
-			# accepting user input to pause and/or terminate the simulation
-			cls.userinput()
+				# accepting user input to pause and/or terminate the simulation
+				if cls.pause_requested:
+					cls.userinput()
+		finally:
+			if prev_handler is not None:
+				_signal.signal(_signal.SIGINT, prev_handler)
 
 		vcd.flush()
 		print("Simulation Ended")
 
 
+	@classmethod
+	def _request_pause(cls, signum, frame):
+		if cls.pause_requested:
+			cls.pause_requested = False
+			raise KeyboardInterrupt
+		cls.pause_requested = True
+
 	@classmethod
 	def userinput(cls):
-		if kb.is_pressed('F10'):
-			print('Simulation paused, press "F10" to resume "F12" to terminate')
-			# waiting for space key to be de-pressed
-			while kb.is_pressed('F10'):
-				pass
-			# waiting for new input
-			while True:
-				if kb.is_pressed('F12'):
-					cls.stop_simulation = True
-					break
-				if kb.is_pressed('F10'):
-					# making sure the spacebar is de-pressed before we continue
-					while kb.is_pressed('F10'):
-						pass
-					print('Simulation resumed')
-					break
+		# the request stays set while prompting, Ctrl+C at the prompt interrupts
+		try:
+			cmd = input('Simulation paused, press "Enter" to resume or type "q" to terminate: ')
+		except EOFError:
+			cmd = "q"
+		cls.pause_requested = False
+		if cmd.strip().lower() == "q":
+			cls.stop_simulation = True
+		else:
+			print('Simulation resumed')
 
 	@classmethod
 	def stop(cls):
@@ -123,27 +144,19 @@ class SimpleSim:
 
 	@classmethod
 	def schedule_event(cls, time_ps):
-		for i in range(len(cls.event_times)):
-			if time_ps == cls.event_times[i]:
-				return
-			elif time_ps < cls.event_times[i]:
-				cls.event_times.insert(time_ps, i)
-				break
-		else:
-			cls.event_times.append(time_ps)
+		if time_ps not in cls.event_set:
+			cls.event_set.add(time_ps)
+			_heapq.heappush(cls.event_times, time_ps)
 
 ################################################################################
 #                              PROCEDURE FUNCTIONS                             #
 ################################################################################
 
+_UNIT_MULT = {"ps": 1, "ns": 1_000, "us": 1_000_000, "ms": 1_000_000_000, "s": 1_000_000_000_000}
+
 def time_unit_to_mult(unit):
-	units = ["ps", "ns", "us", "ms", "s"]
-	mult = 1
-	for i in range(len(units)):
-		if unit == units[i]:
-			break
-		mult *= 1000
-	else:
+	mult = _UNIT_MULT.get(unit)
+	if mult is None:
 		raise Exception(f"Unit of time: {unit} not supported")
 	return mult
 
@@ -24,9 +24,38 @@
 # ---------------------------------------------------------------------------- #
 
 from   __future__ import annotations
-from   typing     import List
 from   copy       import deepcopy
-import math
+
+################################################################################
+#                                   COPYING                                    #
+################################################################################
+
+# immutable values can be shared instead of copied. Tuples and frozensets can
+# only be shared as long as all of their items can
+_IMMUTABLE  = (int, float, bool, str, bytes, type(None), type)
+_CONTAINERS = (tuple, frozenset)
+
+def _fast_copy(x, memo=None):
+	# deep copy of a non-ezhdl member: ezhdl objects are cloned and immutable
+	# values returned as they are, deepcopy() is only the last resort. Like
+	# for deepcopy(), memo maps the id() of the objects already copied as
+	# part of the same copy to their copies, so that aliasing is preserved
+	t = type(x)
+	if t in _IMMUTABLE:
+		return x
+	if memo is not None:
+		ret = memo.get(id(x))
+		if ret is not None:
+			return ret
+	if isinstance(x, HwType):
+		return x._clone(memo)
+	if t in _CONTAINERS:
+		items = [_fast_copy(i, memo) for i in x]
+		for i, j in zip(items, x):
+			if i is not j:
+				return t(items)
+		return x
+	return deepcopy(x, memo)
 
 ################################################################################
 #                              HWTYPE BASE CLASS                               #
@@ -37,7 +66,10 @@ class HwType:
 	# record-like classes by subclassing HwType. It is recommended to use
 	# ezhdl types within such a class as they can be "assigned" the new value.
 	# Class members of other types will be replaced with a "deepcopy" of the
-	# corresponding member of the source object
+	# corresponding member of the source object. _assign() returns True if
+	# the assignment changed the value of the object, which lets the simulator
+	# detect changes without comparing the objects a second time
+	__slots__ = ()
 
 	def _check_type(self, b:Array|any):
 		# the receiving object needs to be a subclass of the source object
@@ -45,17 +77,43 @@ class HwType:
 
 	def _assign(self, other:HwType|any):
 		# we go through all attributes and if we find any other subclasses
-		# of hwbase we
-		for attr_name, attr_value in vars(self).items():
+		# of hwbase we assign them in turn, any other member is replaced with
+		# a copy of the source one
+		changed    = False
+		self_vars  = vars(self)
+		other_vars = vars(other)
+		for attr_name, attr_value in self_vars.items():
+			other_value = other_vars[attr_name]
 			if isinstance(attr_value, HwType):
-				attr_value._assign(vars(other)[attr_name])
-			else:
-				attr_value = deepcopy(vars(other)[attr_name])
-		return self
+				changed |= attr_value._assign(other_value)
+			elif attr_value is not other_value:
+				if attr_value != other_value:
+					changed = True
+				self_vars[attr_name] = _fast_copy(other_value)
+		return changed
+
+	def _clone(self, memo=None):
+		# cheap replacement for deepcopy: members go through _fast_copy, which
+		# clones ezhdl members through their own _clone() method. Members
+		# referring to the same object still do so in the copy
+		if memo is None:
+			memo = {}
+		ret = type(self).__new__(type(self))
+		memo[id(self)] = ret
+		ret_vars = vars(ret)
+		for attr_name, attr_value in vars(self).items():
+			ret_vars[attr_name] = _fast_copy(attr_value, memo)
+		return ret
+
+	def __deepcopy__(self, memo):
+		# deep copies of ezhdl objects (e.g. nested within lists or other user
+		# objects) take the _clone() fast path as well
+		return self._clone(memo)
 
 	# overloading <<= as copy-assignment operator
 	def __ilshift__(self, other:HwType|any):
-		return self._assign(other)
+		self._assign(other)
+		return self
 
 # here we rename HwType to Record for convenience
 class Record(HwType):
@@ -66,25 +124,57 @@ class Record(HwType):
 ################################################################################
 
 def join(*args):
+	# fields do not overlap, so each one is simply or-ed in below the previous
+	# ones. Masking makes negative (signed) fields contribute their bits only
 	ret = 0
 	for i in args:
-		ret <<= i.nbits
-		ret +=  i.val
-	return Integer(ret)
+		nbits = i.nbits
+		ret = (ret << nbits) | (i._val & _MASKS[nbits])
+	return _wrap(ret)
 
 def mask(hi, lo):
 	return ((1 << (hi - lo)) - 1) << lo
 
+class _BitTable(dict):
+	# constants depending on the number of bits, filled in on first use.
+	# Subscripting it is cheaper than both the arithmetic and a function call
+	def __init__(self, fn):
+		super().__init__()
+		self._fn = fn
+
+	def __missing__(self, nbits):
+		ret = self[nbits] = self._fn(nbits)
+		return ret
+
+_MASKS     = _BitTable(lambda nbits: (1 << nbits) - 1)
+_SIGN_BITS = _BitTable(lambda nbits: (1 << (nbits - 1)) if nbits > 0 else 0)
+
 ################################################################################
 #                                    INTEGER                                   #
 ################################################################################
 
+def _v(o):
+	# integer value of an operand. ezhdl integers are read directly, int()
+	# would go through __int__ and the val property
+	return o._val if isinstance(o, Integer) else int(o)
+
+def _wrap(v):
+	# operator results are plain unconstrained integers, so __init__ (and its
+	# trip through the val setter and _constrain) can be skipped
+	ret = Integer.__new__(Integer)
+	ret._val = v
+	return ret
+
 class Integer(HwType):
+	# integers are created in large numbers (every operator returns a new one)
+	# so they keep their state in slots rather than in a __dict__
+	__slots__ = ('_val',)
+
 	def _constrain(self):
 		return self
 
 	def __init__(self, val=0, *args, **kwargs):
-		self.val = val
+		self._val = val._val if isinstance(val, Integer) else val
 		self._constrain()
 
 	@property
@@ -93,108 +183,138 @@ class Integer(HwType):
 
 	@val.setter
 	def val(self, v):
-		if isinstance(v, Integer):
-			self._val = v.val
+		# plain ints are by far the most common value, they are stored without
+		# going through isinstance()
+		if type(v) is int:
+			self._val = v
+		elif isinstance(v, Integer):
+			self._val = v._val
 		else:
 			self._val = v
 		return self
 
 	def chop(self, *args):
-		val = self.val
+		# each field takes the low bits left over by the ones after it, its
+		# own _constrain() keeps only the bits (and sign) it can hold
+		val = self._val
 		for i in reversed(args):
-			i.val = val
+			i._val = val
 			i._constrain()
 			val >>= i.nbits
 
+	def _clone(self, memo=None):
+		# the slots of integers only hold immutable values (and the shared enum
+		# definition) so they are simply copied over. Subclasses add their own
+		# slots, user subclasses without __slots__ may also have a __dict__
+		# whose members are copied like the ones of records
+		ret = type(self).__new__(type(self))
+		ret._val = self._val
+		if memo is not None:
+			memo[id(self)] = ret
+		attrs = getattr(self, "__dict__", None)
+		if attrs:
+			if memo is None:
+				memo = {id(self): ret}
+			ret_vars = vars(ret)
+			for attr_name, attr_value in attrs.items():
+				ret_vars[attr_name] = _fast_copy(attr_value, memo)
+		return ret
+
 	def _assign(self, other:Integer|any):
-		if hasattr(other, "now"):
-			other = other.now
-		self.val = other
-		return self._constrain()
+		old = self._val
+		# integers are by far the most common source (signal updates always
+		# assign one), only other objects need to be probed for being signals
+		if isinstance(other, Integer):
+			self._val = other._val
+		else:
+			now = getattr(other, "now", None)
+			self.val = other if now is None else now
+		self._constrain()
+		return self._val != old
 
 	# mathematical
 	def __add__(self, other):
-		return Integer(self.val + int(other))
+		return _wrap(self._val + _v(other))
 
 	def __radd__(self, other):
-		return self.val + int(other)
+		return self._val + _v(other)
 
 	def __sub__(self, other):
-		return Integer(self.val - int(other))
+		return _wrap(self._val - _v(other))
 
 	def __rsub__(self, other):
-		return int(other) - self.val
+		return _v(other) - self._val
 
 	def __mul__(self, other):
-		return Integer(self.val * int(other))
+		return _wrap(self._val * _v(other))
 
 	def __rmul__(self, other):
-		return self.val * int(other)
+		return self._val * _v(other)
 
 	def __floordiv__(self, other):
-		return Integer(self.val // int(other))
+		return _wrap(self._val // _v(other))
 
 	def __rfloordiv__(self, other):
-		return int(other) // self.val
+		return _v(other) // self._val
 
 	def __neg__(self):
-		return Integer(-self.val)
+		return _wrap(-self._val)
 
 	def __abs__(self):
-		return Integer(abs(self.val))
+		return _wrap(abs(self._val))
 
 	def __lshift__(self, other):
-		return Integer(self.val << int(other))
+		return _wrap(self._val << _v(other))
 
 	def __rshift__(self, other):
-		return Integer(self.val >> int(other))
+		return _wrap(self._val >> _v(other))
 
 	def __rlshift__(self, other):
-		return int(other) << self.val
+		return _v(other) << self._val
 
 	def __rrshift__(self, other):
-		return int(other) >> self.val
+		return _v(other) >> self._val
 
 	# bitwise boolean
 	def __and__(self, other):
-		return Integer(self.val & int(other))
+		return _wrap(self._val & _v(other))
 
 	def __rand__(self, other):
-		return self.val & int(other)
+		return self._val & _v(other)
 
 	def __or__(self, other):
-		return Integer(self.val | int(other))
+		return _wrap(self._val | _v(other))
 
 	def __ror__(self, other):
-		return self.val | int(other)
+		return self._val | _v(other)
 
 	def __xor__(self, other):
-		return Integer(self.val ^ int(other))
+		return _wrap(self._val ^ _v(other))
 
 	def __rxor__(self, other):
-		return self.val ^ int(other)
+		return self._val ^ _v(other)
 
 	def __invert__(self):
-		return Integer(~self.val)
+		return _wrap(~self._val)
 
 	# Comparisons
 	def __lt__(self, other):
-		return self.val < int(other)
+		return self._val < _v(other)
 
 	def __le__(self, other):
-		return self.val <= int(other)
+		return self._val <= _v(other)
 
 	def __gt__(self, other):
-		return self.val > int(other)
+		return self._val > _v(other)
 
 	def __ge__(self, other):
-		return self.val >= int(other)
+		return self._val >= _v(other)
 
 	def __eq__(self, other):
-		return self.val == int(other)
+		return self._val == _v(other)
 
 	def __ne__(self, other):
-		return self.val != int(other)
+		return self._val != _v(other)
 
 	# casts
 	def __bool__(self):
@@ -206,13 +326,13 @@ class Integer(HwType):
 		return self._val
 
 	def __int__(self):
-		return int(self.val)
+		return int(self._val)
 
 	def __float__(self):
-		return float(self.val)
+		return float(self._val)
 
 	def __str__(self):
-		return str(self.val)
+		return str(self._val)
 
 	def __repr__(self):
 		if hasattr(self, "nbits"):
@@ -231,23 +351,24 @@ class Integer(HwType):
 		raise NotImplementedError('Integers have no "length"')
 
 	def __getitem__(self, key):
-		if isinstance(key, slice):
-			hi = key.start if key.start is not None else self.nbits
-			lo = key.stop if key.stop is not None else 0
-			if hi < 0:
-				hi += len(self)
-			if lo < 0:
-				lo += len(self)
-		else:
+		if not isinstance(key, slice):
+			# single bits are by far the most common access
 			if key < 0:
 				key += len(self)
-			hi = key + 1
-			lo = key
+			return type(self)((self._val >> key) & 1, nbits=1)
+
+		hi = key.start if key.start is not None else self.nbits
+		lo = key.stop if key.stop is not None else 0
+		if hi < 0:
+			hi += len(self)
+		if lo < 0:
+			lo += len(self)
 
 		if lo > hi:
 			raise Exception("Integer slices must have downward direction")
 
-		val = (self._val & mask(hi, lo)) >> lo
+		# shifting first means the mask does not have to be moved to lo
+		val = (self._val >> lo) & ((1 << (hi - lo)) - 1)
 		ret = type(self)(val, nbits=hi - lo)
 		return ret
 
@@ -270,20 +391,21 @@ class Integer(HwType):
 		if lo > hi:
 			raise Exception("Integer slices must have downward direction")
 
-		m = mask(hi, lo)
-		self._val &= ~m
-		self._val += (value << lo) & m
+		m = ((1 << (hi - lo)) - 1) << lo
+		self._val = (self._val & ~m) | ((_v(value) << lo) & m)
 		return self._constrain()
 
 	@property
 	def dump(self):
-		return self.val
+		return self._val
 
 ################################################################################
 #                                     WIRE                                     #
 ################################################################################
 
 class Wire(Integer):
+	__slots__ = ()
+
 	def _constrain(self):
 		self._val &= 1
 		return self
@@ -296,20 +418,43 @@ class Wire(Integer):
 ################################################################################
 
 class Unsigned(Integer):
+	__slots__ = ('_nbits', '_mask')
+
+	# the mask is needed by every assignment, so it is kept up to date along
+	# with the number of bits rather than looked up each time
+	@property
+	def nbits(self):
+		return self._nbits
+
+	@nbits.setter
+	def nbits(self, nbits):
+		self._nbits = nbits
+		self._mask  = _MASKS[nbits]
+
 	def mask(self):
-		return (1 << self.nbits) - 1
+		return self._mask
 
 	def _constrain(self):
-		self._val &= self.mask()
+		self._val &= self._mask
 		return self
 
 	def __init__(self, val=0, nbits=32, *args, **kwargs):
-		self.nbits = max(nbits, 0)
-		self.val   = val
-		self._constrain()
+		# same as setting val and constraining it, without the extra calls
+		nbits       = nbits if nbits > 0 else 0
+		self._nbits = nbits
+		self._mask  = mask = _MASKS[nbits]
+		self._val   = (val._val if isinstance(val, Integer) else val) & mask
+		if type(self)._constrain is not Unsigned._constrain:
+			self._constrain()
+
+	def _clone(self, memo=None):
+		ret = super()._clone(memo)
+		ret._nbits = self._nbits
+		ret._mask  = self._mask
+		return ret
 
 	def __len__(self):
-		return self.nbits
+		return self._nbits
 
 	def bits(self, nbits):
 		self.nbits = nbits
@@ -321,7 +466,7 @@ class Unsigned(Integer):
 		elif spn == 1:
 			self.nbits = 1
 		else:
-			self.nbits = int(math.ceil(math.log2(spn)))
+			self.nbits = (spn - 1).bit_length()
 		return self._constrain()
 
 	def upto(self, val):
@@ -331,27 +476,109 @@ class Unsigned(Integer):
 			raise Exception(f"Value {val} cannot be represented with Unsigned type")
 		return self.span(rng)
 
+################################################################################
+#                                   WIRE BUS                                   #
+################################################################################
+
+# a vector of wires packed in a single integer, bit i holding wire i. Bitwise
+# operations on the whole bus are a single int operation instead of one per
+# wire, as they would be on an Array of Wires
+
+class WireBus(Unsigned):
+	__slots__ = ()
+
+	def __init__(self, val=0, nbits=32, *args, **kwargs):
+		# also constructible from an Array (or any sequence) of wires
+		if isinstance(val, (list, tuple)):
+			packed = 0
+			for i, w in enumerate(val):
+				packed |= (_v(w) & 1) << i
+			nbits = len(val)
+			val   = packed
+		super().__init__(val, nbits)
+
+	def _bus(self, val):
+		# result of a bitwise operation, same width as this bus
+		ret = WireBus.__new__(WireBus)
+		ret._nbits = self._nbits
+		ret._mask  = self._mask
+		ret._val   = val & self._mask
+		return ret
+
+	def __getitem__(self, key):
+		if not isinstance(key, slice):
+			if key < 0:
+				key += self._nbits
+			return Wire((self._val >> key) & 1)
+		return super().__getitem__(key)
+
+	def __and__(self, other):
+		return self._bus(self._val & _v(other))
+
+	def __or__(self, other):
+		return self._bus(self._val | _v(other))
+
+	def __xor__(self, other):
+		return self._bus(self._val ^ _v(other))
+
+	def __invert__(self):
+		return self._bus(~self._val)
+
+	__rand__ = __and__
+	__ror__  = __or__
+	__rxor__ = __xor__
+
+	@property
+	def wires(self):
+		return Array([Wire((self._val >> i) & 1) for i in range(self._nbits)], cpy=False)
+
 ################################################################################
 #                                    SIGNED                                    #
 ################################################################################
 
 class Signed(Integer):
+	__slots__ = ('_nbits', '_mask', '_sign')
+
+	# mask and sign bit are needed by every assignment, so they are kept up to
+	# date along with the number of bits rather than looked up each time
+	@property
+	def nbits(self):
+		return self._nbits
+
+	@nbits.setter
+	def nbits(self, nbits):
+		self._nbits = nbits
+		self._mask  = _MASKS[nbits]
+		self._sign  = _SIGN_BITS[nbits]
+
 	def mask(self):
-		return (1 << self.nbits) - 1
+		return self._mask
 
 	def _constrain(self):
-		self._val &= self.mask()
-		if self._val >> (self.nbits - 1):
-			self._val -= (1 << self.nbits)
+		# sign extension without branching on the sign bit
+		sign      = self._sign
+		self._val = ((self._val & self._mask) ^ sign) - sign
 		return self
 
 	def __init__(self, val=0, nbits=32, *args, **kwargs):
-		self.nbits = max(nbits, 0)
-		self.val   = val
-		self._constrain()
+		# same as setting val and constraining it, without the extra calls
+		nbits       = nbits if nbits > 0 else 0
+		self._nbits = nbits
+		self._mask  = mask = _MASKS[nbits]
+		self._sign  = sign = _SIGN_BITS[nbits]
+		self._val   = (((val._val if isinstance(val, Integer) else val) & mask) ^ sign) - sign
+		if type(self)._constrain is not Signed._constrain:
+			self._constrain()
+
+	def _clone(self, memo=None):
+		ret = super()._clone(memo)
+		ret._nbits = self._nbits
+		ret._mask  = self._mask
+		ret._sign  = self._sign
+		return ret
 
 	def __len__(self):
-		return self.nbits
+		return self._nbits
 
 	def bits(self, nbits):
 		self.nbits = nbits
@@ -363,7 +590,7 @@ class Signed(Integer):
 		elif spn == 1:
 			self.nbits = 1
 		else:
-			self.nbits = int(math.ceil(math.log2(spn)))
+			self.nbits = (spn - 1).bit_length()
 		return self._constrain()
 
 	def upto(self, val):
@@ -380,13 +607,15 @@ class Signed(Integer):
 
 class EnumDef:
 	def __init__(self, *args):
-		self._str = []
-		for i in range(len(args)):
-			if not isinstance(args[i], str):
+		for i, key in enumerate(args):
+			if not isinstance(key, str):
 				raise Exception("Enumeration keys must be strings")
-			self.__setattr__(args[i], i)
-			self._str.append(args[i])
+			setattr(self, key, i)
+		# keys never change, so they are kept in a tuple indexed by value
+		self._str = tuple(args)
 		self._len = len(args)
+		# width of the longest key, enum signals report it as their length
+		self._max_len = max((len(i) for i in self._str), default=0)
 
 	# reports the number of elements in the enumeration definition
 	def __len__(self):
@@ -394,28 +623,34 @@ class EnumDef:
 
 
 class Enum(Unsigned):
+	__slots__ = ('_enum_def',)
+
 	def __init__(self, enum_def:EnumDef, val:Integer|any=0):
 		super().__init__(val)
 		self.span(len(enum_def))
 		self._enum_def = enum_def
 
+	def _clone(self, memo=None):
+		ret = super()._clone(memo)
+		ret._enum_def = self._enum_def
+		return ret
+
 	# reports the maximum length of the associated strings
 	def __len__(self):
-		ret = len(max(self._enum_def._str, key=len))
-		return ret
+		return self._enum_def._max_len
 
 	def __str__(self):
-		return self._enum_def._str[self.val]
+		return self._enum_def._str[self._val]
 
 	@property
 	def dump(self):
-		return str(self)
+		return self._enum_def._str[self._val]
 
 ################################################################################
 #                                     ARRAY                                    #
 ################################################################################
 
-class Array(List, HwType):
+class Array(list, HwType):
 
 	def __init__(self, val, cpy=True):
 		super().__init__([])
@@ -425,12 +660,29 @@ class Array(List, HwType):
 				raise Exception("Only HwType allowed for array contents")
 
 		if cpy:
+			# the same prototype is often repeated (e.g. [Unsigned()]*N), cloning
+			# it is much cheaper than a deepcopy per element
 			for i in val:
-				self.append(deepcopy(i))
+				self.append(_fast_copy(i))
 		else:
-			for i in val:
-				self.append(i)
-
+			list.extend(self, val)
+
+		self._elem_type = self._common_int_type()
+
+	def _common_int_type(self):
+		# arrays whose elements are all integers of one and the same type (the
+		# usual case) are type-checked and assigned without looking at every
+		# element. Arrays do not change shape once built, so this is only
+		# worked out at construction
+		if len(self) == 0:
+			return None
+		t = type(list.__getitem__(self, 0))
+		if not issubclass(t, Integer) or t._check_type is not HwType._check_type:
+			return None
+		for i in self:
+			if type(i) is not t:
+				return None
+		return t
 
 	def _check_type(self, b:Array|any):
 		if len(self) != len(b):
@@ -441,6 +693,11 @@ class Array(List, HwType):
 		if not isinstance(self, type(b)):
 			return False
 
+		elem_type = self._elem_type
+		b_elem_type = getattr(b, "_elem_type", None)
+		if elem_type is not None and b_elem_type is not None:
+			return issubclass(elem_type, b_elem_type)
+
 		# all members need to be compatible
 		for i in range(len(self)):
 			if isinstance(self[i], type(b[i])):
@@ -453,36 +710,50 @@ class Array(List, HwType):
 		return True
 
 	def _assign(self, other:Array):
+		changed = False
 		if self._check_type(other):
-			if len(self) != 0:
-				if hasattr(super().__getitem__(0), "_assign"):
+			if self._elem_type is not None:
+				for dst, src in zip(list.__iter__(self), list.__iter__(other)):
+					changed |= dst._assign(src)
+			elif len(self) != 0:
+				if getattr(super().__getitem__(0), "_assign", None) is not None:
 					for i in range(len(self)):
 						# Array's __getitem__ always returns a copy, so we need to
 						# call the super() version which returns a reference
-						super().__getitem__(i)._assign(other[i])
+						changed |= super().__getitem__(i)._assign(other[i])
 				else:
 					for i in range(len(self)):
+						changed |= (self[i] != other[i])
 						# this just calls setitem
-						self[i] = deepcopy(other[i])
+						self[i] = _fast_copy(other[i])
 		else:
 			raise Exception(f"Incompatible assignment from {type(other)} to {type(self)}")
-		return self
+		return changed
 
-	def __getitem__(self, key):
-		ret = super().__getitem__(key)
-		if isinstance(ret, list):
-			return Array(ret, cpy=False)
+	def _clone(self, memo=None):
+		if memo is None:
+			memo = {}
+		ret = super()._clone(memo)
+		for i in self:
+			list.append(ret, _fast_copy(i, memo))
 		return ret
 
+	def __getitem__(self, key):
+		ret = list.__getitem__(self, key)
+		if type(key) is not slice:
+			return ret
+		# slices share the elements, and are as homogeneous as the array
+		sub = Array.__new__(Array)
+		list.extend(sub, ret)
+		sub._elem_type = self._elem_type if self._elem_type is not None else sub._common_int_type()
+		return sub
+
 	@property
 	def val(self):
-		ret = []
-		for i in self:
-			if hasattr(i, "val"):
-				ret.append(i.val)
-			else:
-				ret.append(i)
-		return ret
+		if self._elem_type is not None:
+			return [i._val for i in self]
+		# elements without a value (e.g. records) are returned as they are
+		return [getattr(i, "val", i) for i in self]
 
 	@property
 	def dump(self):
@@ -23,8 +23,10 @@
 #  limitations under the License.                                              #
 # ---------------------------------------------------------------------------- #
 
-from   vcd.writer import VCDWriter
+from   vcd.writer import VCDWriter, ScalarVariable, VectorVariable
 import subprocess as sp
+from   operator   import attrgetter
+from   functools  import partial
 
 try:
 	from ezhdl.ez_types  import *
@@ -34,77 +36,211 @@ except:
 	from ez_signal import *
 
 class VCD:
-	def __init__(self, path, timescale, live=False):
+	def __init__(self, path, timescale, live=False, write_buffer=1 << 20):
 		self.vcd_file = None
+		self.vcd_path = path
+		# gtkwave is launched (once) as soon as the header is in the file
+		self.vcd_live = live and path != None
+
+		# registered signals along with their VCD variable and its formatter,
+		# or for records the (variable, formatter, getter) triplets of all
+		# their leaves. This way dump() does not have to look at every signal
+		# in the design nor walk records
+		self._dumpers = []
+		# the same entries keyed by id() of the signal, used to only dump the
+		# signals that changed
+		self._dumpers_by_id = {}
 
 		if path != None:
-			self.vcd_live   = live
-			self.vcd_file   = open(path, "w")
+			# VCD output is a long stream of tiny writes, a large buffer turns
+			# them into few big ones (the buffer size can be lowered on machines
+			# short on memory). The file is only flushed explicitly
+			self.vcd_file   = open(path, "w", buffering=write_buffer, encoding="utf-8", newline="\n")
 			self.vcd_writer = VCDWriter(self.vcd_file, timescale="1 "+timescale)
+			# batched writes keep the internal state of the writer up to date,
+			# writers not having the expected state go through change() only
+			self._batch = all(hasattr(self.vcd_writer, a) for a in _WRITER_STATE)
 
-			for i in Signal.instances:
-				s : Signal = i()
+			for s in Signal._instances.values():
 				self.register_signal(s)
 
 
 	def flush(self):
-		self.vcd_file.flush()
+		if self.vcd_file != None:
+			self.vcd_file.flush()
 
 
-	def register_record(self, s, rec, scope, name):
+	def register_record(self, s, rec, scope, name, attr_prefix=""):
+		# returns the (variable, formatter, getter) triplets of the leaves, the
+		# getters fetch the leaf from the record the signal holds at the time
+		# of the dump. Nested records get the dotted prefixes of their parents
 		if s.vcd == None:
 			s.vcd = []
-		attr = vars(rec).items()
-		for n, v in attr:
+		leaves = []
+		for n, v in vars(rec).items():
+			leaf_name = name + "." + n
+			leaf_attr = attr_prefix + n
 			if isinstance(v, Record):
-				self.register_record(s, v, scope, '.'.join([name, n]))
+				leaves += self.register_record(s, v, scope, leaf_name, leaf_attr + ".")
 			else:
 				s_type, s_size = get_vcd_specs(v)
 				if s_type != None:
-					s.vcd.append(self.vcd_writer.register_var(scope=scope,
-						name='.'.join([name, n]), var_type=s_type, size=s_size))
+					var = self.vcd_writer.register_var(scope=scope,
+						name=leaf_name, var_type=s_type, size=s_size)
+					s.vcd.append(var)
+					leaves.append((var, self._formatter(var, v), attrgetter(leaf_attr)))
+		return leaves
+
+
+	def _formatter(self, var, value):
+		# function turning the dump of value into its VCD value change. ezhdl
+		# integers never exceed their width, so the ones that map to plain
+		# scalar and vector variables skip the formatting (and checks) of pyvcd
+		ident = var.ident
+		if isinstance(value, Integer):
+			if type(var) is ScalarVariable:
+				return ("0" + ident, "1" + ident).__getitem__
+			if type(var) is VectorVariable and isinstance(value, (Unsigned, Signed)):
+				size = var.size
+				if size <= 8:
+					# negative indexes pick the two's complement of signed values
+					table = _vcd_bin_values(size)
+					return lambda v: table[v] + ident
+				mask = (1 << size) - 1
+				return lambda v: f"b{v & mask:b} {ident}"
+		return partial(var.format_value, check=getattr(self.vcd_writer, "_check_values", True))
+
+
+	@staticmethod
+	def _values(dumpers):
+		# (variable, formatter, value) triplets of the given dumpers
+		for s, var, fmt, leaves in dumpers:
+			if var is None:
+				rec = s.now
+				for leaf_var, leaf_fmt, getter in leaves:
+					yield leaf_var, leaf_fmt, getter(rec).dump
+			else:
+				yield var, fmt, s.now.dump
 
 
 	def register_signal(self, s):
 		if isinstance(s.now, Record):
-			self.register_record(s, s.now, s.path, s.name)
+			leaves = self.register_record(s, s.now, s.path, s.name)
+			if leaves:
+				self._add_dumper(s, None, None, tuple(leaves))
 		else:
 			s_type, s_size = get_vcd_specs(s)
 			if s_type != None:
 				s.vcd = self.vcd_writer.register_var(scope=s.path,
 						name=s.name, var_type=s_type, size=s_size)
+				self._add_dumper(s, s.vcd, self._formatter(s.vcd, s.now), None)
+
+
+	def _add_dumper(self, s, var, fmt, leaves):
+		dumper = (s, var, fmt, leaves)
+		self._dumpers.append(dumper)
+		self._dumpers_by_id[id(s)] = dumper
 
 
 	def dump(self, timestamp, force=False):
-		if self.vcd_file != None:
-			for i in Signal.instances:
-				s = i()
-				if (s._transition or force) and s.vcd != None:
-					if isinstance(s.now, Record):
-						self.dump_record(s, s.now, timestamp)
-					else:
-						self.vcd_writer.change(s.vcd, timestamp=timestamp, value=s.now.dump)
-
-			if self.vcd_live and self.vcd_file.tell():
+		# unless forced, only the signals that changed since the last
+		# clear_changes() are looked at, not every signal of the design. Time
+		# steps in which nothing changed return straight away
+		if self.vcd_file != None and (force or Signal._dirty):
+			if force:
+				dumpers = self._dumpers
+			else:
+				by_id   = self._dumpers_by_id
+				dumpers = [by_id[i] for i in Signal._dirty if i in by_id]
+
+			writer = self.vcd_writer
+			if (not self._batch or writer._registering or not writer._dumping
+					or timestamp < writer._timestamp):
+				# the writer still has to emit the header and the initial values
+				# (or report an error), or does not have the state batched writes
+				# rely on: this goes through its own change()
+				change = writer.change
+				for var, fmt, value in self._values(dumpers):
+					change(var, timestamp, value)
+			else:
+				# all the changes of the time step are formatted and written in
+				# one go, keeping the state of the writer as change() would
+				lines = []
+				# the last value written is kept by the variable itself. Enum
+				# strings and small ints are shared objects, so the identity
+				# test settles most of the signals that did not change
+				for var, fmt, value in self._values(dumpers):
+					if value is not var.value and value != var.value:
+						var.value = value
+						lines.append(fmt(value))
+				writer._timestamp = timestamp
+				if lines:
+					if writer._last_dumped_ts != timestamp:
+						writer._last_dumped_ts = timestamp
+						lines.insert(0, f"#{timestamp}")
+					lines.append("")
+					self.vcd_file.write("\n".join(lines))
+
+			if self.vcd_live and not writer._registering:
 				self.vcd_live = False
+				self.vcd_file.flush()
 				sp.Popen(["gtkwave", self.vcd_path])
 
 
-	def dump_record(self, s, rec, timestamp, idx = 0):
-		attr = vars(rec).items()
-		for n, v in attr:
-			if isinstance(v, Record):
-				self.dump_record(s, v, timestamp, idx)
-			else:
-				self.vcd_writer.change(s.vcd[idx], timestamp=timestamp, value=v.dump)
-			idx += 1
+
+# internal state of pyvcd's VCDWriter (written against 0.5) that batched
+# writes need to keep in sync with what change() would do
+_WRITER_STATE = ("_registering", "_dumping", "_timestamp", "_last_dumped_ts")
+
+
+# VCD type and size of the value types, looked up by exact type. Subclasses
+# that are not listed go through the isinstance() chain of _vcd_specs_of()
+_VCD_SPECS = {
+	Wire     : lambda s: ("wire"   , 1     ),
+	WireBus  : lambda s: ("wire"   , len(s)),
+	Enum     : lambda s: ("string" , len(s)),
+	Unsigned : lambda s: ("integer", len(s)),
+	Signed   : lambda s: ("integer", len(s)),
+	Integer  : lambda s: ("integer", None  ),
+	int      : lambda s: ("integer", None  ),
+	float    : lambda s: ("real"   , None  ),
+}
+
+
+# "b<bits> " prefixes of all the values of narrow vectors, one table per width
+# shared by all the variables of that width
+_VCD_BIN_VALUES = {}
+
+def _vcd_bin_values(size):
+	table = _VCD_BIN_VALUES.get(size)
+	if table is None:
+		table = _VCD_BIN_VALUES[size] = [f"b{v:b} " for v in range(1 << size)]
+	return table
+
+
+def _vcd_specs_of(s):
+	spec = _VCD_SPECS.get(type(s))
+	if spec is not None:
+		return spec(s)
+
+	if isinstance(s, Wire):
+		return "wire", 1
+	elif isinstance(s, WireBus):
+		return "wire", len(s)
+	elif isinstance(s, Enum):
+		return "string", len(s)
+	elif isinstance(s, (Unsigned, Signed)):
+		return "integer", len(s)
+	elif isinstance(s, (Integer, int)):
+		return "integer", None
+	elif isinstance(s, float):
+		return "real", None
+	return None, None
 
 
 def get_vcd_specs(s : Signal|HwType):
 	if isinstance(s, Signal):
 		s = s.now
-	s_size = None
-	s_type = None
 	elements = 0
 
 	if isinstance(s, Array):
@@ -114,24 +250,7 @@ def get_vcd_specs(s : Signal|HwType):
 			return None, None
 		s = s[0]
 
-	if isinstance(s, Wire):
-		s_size = 1
-		s_type = "wire"
-	elif isinstance(s, Enum):
-		s_type = "string"
-		s_size = len(s)
-	elif isinstance(s, Unsigned):
-		s_size = len(s)
-		s_type = "integer"
-	elif isinstance(s, Signed):
-		s_size = len(s)
-		s_type = "integer"
-	elif isinstance(s, Integer):
-		s_type = "integer"
-	elif isinstance(s, int):
-		s_type = "integer"
-	elif isinstance(s, float):
-		s_type = "real"
+	s_type, s_size = _vcd_specs_of(s)
 
 	if s_size != 0:
 		if elements != 0: